@@ -1,20 +1,79 @@
+import io
 import json
+import os
 from pathlib import Path
 from datetime import datetime
 import re
 
+try:
+    # orjson is a much faster drop-in for json.loads, use it when available
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# matching on str is faster than a bytes pattern plus encode/decode round-trip
+_ANSI_RE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+
+# entry types that never show up in the converted conversation
+_NOISE_TYPES = frozenset({'file-history-snapshot', 'system'})
+
+# ISO timestamps parse_timestamp can slice without datetime: month 01-12,
+# hour 00-23, minute and second 00-59, and day 01-28 so that it is valid in
+# every month (later days go through datetime, which knows the month lengths)
+_ISO_TS_RE = re.compile(
+    r'[0-9]{4}-(?:0[1-9]|1[0-2])-(?:0[1-9]|1[0-9]|2[0-8])'
+    r'T(?:[01][0-9]|2[0-3]):[0-5][0-9]:[0-5][0-9]'
+    r'(?:\.[0-9]+)?(?:Z|[+-][0-9]{2}:[0-9]{2})?')
+
+# parse_timestamp results keyed by raw timestamp string
+_TS_CACHE = {}
+
 def parse_timestamp(ts_str):
     """Parse ISO timestamp to readable format."""
     try:
-        dt = datetime.fromisoformat(ts_str.replace('Z', '+00:00'))
-        return dt.strftime('%Y-%m-%d %H:%M:%S')
-    except:
+        # ISO timestamps already carry the wall-clock fields we print, so
+        # slice them out directly instead of round-tripping through datetime
+        if _ISO_TS_RE.fullmatch(ts_str) is not None:
+            return ts_str[:10] + ' ' + ts_str[11:19]
+    except TypeError:
         return ts_str
+    cached = _TS_CACHE.get(ts_str)
+    if cached is not None:
+        return cached
+    try:
+        if ts_str.endswith('Z'):
+            ts_str_iso = ts_str[:-1] + '+00:00'
+        else:
+            ts_str_iso = ts_str
+        dt = datetime.fromisoformat(ts_str_iso)
+        result = dt.strftime('%Y-%m-%d %H:%M:%S')
+    except:
+        result = ts_str
+    _TS_CACHE[ts_str] = result
+    return result
 
 def clean_ansi_codes(text):
     """Remove ANSI escape codes from text."""
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    return ansi_escape.sub('', text)
+    # every ANSI sequence starts with ESC, so skip the regex when there is none
+    if '\x1b' not in text:
+        return text
+    return _ANSI_RE.sub('', text)
+
+def tool_result_text(content):
+    """Flatten tool_result content (a string or list of blocks) to text."""
+    if isinstance(content, str):
+        return content
+    if not isinstance(content, list):
+        # null (or anything else) has no text to show
+        return ''
+    texts = []
+    for subblock in content:
+        if isinstance(subblock, str):
+            texts.append(subblock)
+        elif isinstance(subblock, dict) and subblock.get('type') == 'text':
+            texts.append(subblock.get('text', ''))
+    return '\n'.join(texts)
 
 def extract_message_content(message):
     """Extract text content from message object."""
@@ -25,31 +84,18 @@ def extract_message_content(message):
                 return content
             #elif isinstance(content, list):
             else:
-                print(f"{type(content)=}")
                 # Extract text from content blocks
                 texts = []
+                append = texts.append
                 for block in content:
-                    #print('\t', repr(block))
-                    #print(f"{block.keys()=}")
-                    if isinstance(block, dict) and block.get('type') == 'text':
-                        texts.append(block.get('text', ''))
-                    elif isinstance(block, dict) and block.get('type') == 'tool_use':
-                        texts.append("```\n" + str(block) + "\n```")
-                    elif isinstance(block, dict) and block.get('type') == 'tool_result':
-                        texts.append("```\n" + str(block) + "\n```")
-
-                        # if isinstance(block, str):
-                        #     texts.append(block)
-                        # else:
-                        #     for subblock in block.get('content',[]):
-                        #         if isinstance(subblock, str):
-                        #             texts.append(subblock)
-                        #         else:
-                        #             #print(subblock)
-                        #             x = subblock.get('text','')
-                        #             print('tool_result', x)
-                        #             texts.append(x)
-                    #print(f"{texts=}")
+                    if type(block) is dict:
+                        btype = block.get('type')
+                        if btype == 'text':
+                            append(block.get('text', ''))
+                        elif btype == 'tool_use':
+                            append(f"```\ntool: {block.get('name', '?')} input={block.get('input', '')}\n```")
+                        elif btype == 'tool_result':
+                            append(f"```\n{tool_result_text(block.get('content', ''))}\n```")
                 return '\n'.join(texts)
         elif 'role' in message and 'content' in message:
             return message.get('content', '')
@@ -60,39 +106,33 @@ def is_noise_message(entry):
     msg_type = entry.get('type', '')
     
     # Filter out these types
-    if msg_type in ['file-history-snapshot', 'system']:
+    if msg_type in _NOISE_TYPES:
         return True
     
     # Filter meta messages
     if entry.get('isMeta', False):
         return True
     
-    # Filter command outputs (optional - set to False to include them)
-    if msg_type == 'user' and 'local-command-stdout' in extract_message_content(entry.get('message', {})):
-        return False
-    
     return False
 
 def format_message(entry):
     """Format a single message entry as markdown."""
     msg_type = entry.get('type', 'unknown')
-    timestamp = parse_timestamp(entry.get('timestamp', ''))
     message = entry.get('message', {})
-    uid = entry.get('uuid')
-    
-    if entry.get('type')=='user' and  isinstance(message.get('content'),str):
-        is_actually_user = True
-    else:
-        is_actually_user = False
 
     # Extract content
     content = extract_message_content(message)
-    content = clean_ansi_codes(content)
+    if '\x1b' in content:
+        content = clean_ansi_codes(content)
     
-    # Skip empty messages
-    if not content or content.strip() == '':
+    # Skip empty messages before doing any formatting work
+    if not content or content.isspace():
         return None
     
+    timestamp = parse_timestamp(entry.get('timestamp', ''))
+    uid = entry.get('uuid')
+    is_actually_user = msg_type == 'user' and isinstance(message.get('content'), str)
+    
     # Format based on type
     #if msg_type == 'user':
     #    role = message.get('role', 'user')
@@ -115,75 +155,170 @@ def format_message(entry):
         
     return None
 
-def convert_jsonl_to_markdown(jsonl_path, output_path=None, include_metadata=True):
-    """Convert JSONL chat log to markdown."""
-    jsonl_path = Path(jsonl_path)
-    
-    if output_path is None:
-        output_path = jsonl_path.with_suffix('.md')
-    else:
-        output_path = Path(output_path)
-    
-    print(f"Reading {jsonl_path.name}...")
-    
-    # Read and parse JSON lines
-    messages = []
-    with open(jsonl_path, 'r', encoding='utf-8') as f:
+def iter_jsonl_entries(jsonl_path):
+    """Yield the parsed entries of a JSONL chat log, skipping lines that can not be parsed."""
+    with open(jsonl_path, 'rb') as f:
         for line_num, line in enumerate(f, 1):
             line = line.strip()
             if not line:
                 continue
             
             try:
-                entry = json.loads(line)
-                if not is_noise_message(entry):
-                    messages.append(entry)
+                entry = json_loads(line)
             except json.JSONDecodeError as e:
                 print(f"Warning: Could not parse line {line_num}: {e}")
                 continue
+            yield entry
+
+def convert_jsonl_to_markdown(jsonl_path, output_path=None, include_metadata=True, now=None, metadata=None):
+    """Convert JSONL chat log to markdown, returns the markdown path.
     
-    print(f"Found {len(messages)} messages")
-    
-    # Sort by timestamp
-    messages.sort(key=lambda x: x.get('timestamp', ''))
+    now is the conversion datetime (default datetime.now()). metadata is an
+    optional dict, filled with the log's summary metadata in the format of
+    read_log_metadata() so that a summary needs no second read.
+    """
+    jsonl_path = Path(jsonl_path)
     
-    # Generate markdown
-    md_lines = []
+    if output_path is None:
+        output_path = jsonl_path.with_suffix('.md')
     
-    # Add header
-    md_lines.append(f"# Chat Log: {jsonl_path.stem}\n")
-    md_lines.append(f"**Converted**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    print(f"Reading {jsonl_path.name}...")
     
-    # Extract session metadata if available
-    if messages and include_metadata:
-        first_msg = messages[0]
-        session_id = first_msg.get('sessionId', 'Unknown')
-        git_branch = first_msg.get('gitBranch', 'Unknown')
+    output_path = convert_entries_to_markdown(iter_jsonl_entries(jsonl_path), output_path, jsonl_path.stem,
+                                              include_metadata, now, metadata)
+    if metadata is not None:
+        metadata.update({'path': jsonl_path, 'stem': jsonl_path.stem})
+    return output_path
+
+def convert_entries_to_markdown(entries, output_path, title, include_metadata=True, now=None, metadata=None):
+    """Convert parsed chat log entries (in file order) to markdown, returns the markdown path.
+    
+    title is shown in the header (the JSONL file name stem for
+    convert_jsonl_to_markdown). metadata is an optional dict, filled with
+    the message count, first and last timestamp and git branch of the log.
+    """
+    if now is None:
+        now = datetime.now()
+    output_path = Path(output_path)
+    # imported here, the commit hook imports this module on every run
+    import tempfile
+    
+    # Each message is formatted as soon as it is read and spooled to a
+    # temporary file, only its (timestamp, offset, size) is kept. With a
+    # lazy entries iterable memory stays at about one message.
+    positions = []
+    in_order = True
+    last_sort_key = None
+    msg_count = 0
+    first_msg = None  # (sort key, session id, git branch) of the first message once sorted
+    first_timestamp = None
+    last_timestamp = None
+    git_branch = None
+    with tempfile.TemporaryFile() as spool:
+        offset = 0
+        for entry in entries:
+            # Noise is dropped before counting, unlike empty messages, which
+            # count as messages but are not written (format_message gives None)
+            if is_noise_message(entry):
+                continue
+            sort_key = entry.get('timestamp', '')
+            if msg_count and sort_key < last_sort_key:
+                in_order = False
+            last_sort_key = sort_key
+            if first_msg is None or sort_key < first_msg[0]:
+                first_msg = (sort_key, entry.get('sessionId', 'Unknown'), entry.get('gitBranch', 'Unknown'))
+            msg_count += 1
+            # Session metadata in file order, reused by the summary
+            ts = entry.get('timestamp')
+            if ts:
+                if first_timestamp is None:
+                    first_timestamp = ts
+                last_timestamp = ts
+            if git_branch is None:
+                git_branch = entry.get('gitBranch')
+            
+            formatted = format_message(entry)
+            if formatted:
+                # each message is terminated by its own separator
+                data = (formatted + "\n---\n\n").encode('utf-8')
+                spool.write(data)
+                positions.append((sort_key, offset, len(data)))
+                offset += len(data)
         
-        md_lines.append("## Session Information\n")
-        md_lines.append(f"- **Session ID**: `{session_id}`")
-        md_lines.append(f"- **Git Branch**: `{git_branch}`")
-        md_lines.append(f"- **Total Messages**: {len(messages)}\n")
-    
-    md_lines.append("---\n")
-    md_lines.append("## Conversation\n")
-    
-    # Add messages
-    for entry in messages:
-        formatted = format_message(entry)
-        if formatted:
-            md_lines.append(formatted)
-            md_lines.append("---\n")
-    
-    # Write to file
-    output_text = '\n'.join(md_lines)
-    output_path.write_text(output_text, encoding='utf-8')
+        print(f"Found {msg_count} messages")
+        
+        # Sort by timestamp (offset breaks ties, keeping file order); logs are
+        # usually written chronologically already, so only sort when needed
+        if not in_order:
+            positions.sort()
+        
+        _write_markdown(output_path, title, now, msg_count, first_msg,
+                        spool, None if in_order else positions, include_metadata)
     
     print(f"Saved markdown to {output_path}")
+    if metadata is not None:
+        metadata.update({
+            'msg_count': msg_count,
+            'first_ts': first_timestamp,
+            'last_ts': last_timestamp,
+            'git_branch': git_branch,
+        })
     return output_path
 
+def _write_markdown(output_path, title, now, msg_count, first_msg, spool, positions, include_metadata):
+    """Write the markdown of a chat log from the spooled messages.
+    
+    first_msg is (sort key, session id, git branch) of the first message,
+    positions the sorted (sort key, offset, size) of the spooled messages,
+    None when they are spooled in order already.
+    """
+    with open(output_path, 'w', encoding='utf-8', buffering=1 << 20) as out:
+        # Add header
+        out.write(f"# Chat Log: {title}\n\n")
+        out.write(f"**Converted**: {now.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        
+        # Extract session metadata if available
+        if first_msg is not None and include_metadata:
+            _, session_id, first_branch = first_msg
+            
+            out.write("## Session Information\n\n")
+            out.write(f"- **Session ID**: `{session_id}`\n")
+            out.write(f"- **Git Branch**: `{first_branch}`\n")
+            out.write(f"- **Total Messages**: {msg_count}\n\n")
+        
+        out.write("---\n\n")
+        out.write("## Conversation\n\n")
+        
+        # Add messages
+        spool.seek(0)
+        if positions is None:
+            text = io.TextIOWrapper(spool, encoding='utf-8')
+            for chunk in iter(lambda: text.read(1 << 20), ''):
+                out.write(chunk)
+            text.detach()
+        else:
+            for _, offset, size in positions:
+                spool.seek(offset)
+                out.write(spool.read(size).decode('utf-8'))
+    
+    # each log is self-contained, don't let the cache grow across files
+    _TS_CACHE.clear()
+
+def _convert_one(jsonl_file, output_dir=None):
+    """Convert one JSONL file of a folder and return its metadata, used as the process pool worker."""
+    if output_dir:
+        output_path = Path(output_dir) / jsonl_file.with_suffix('.md').name
+    else:
+        output_path = jsonl_file.with_suffix('.md')
+    metadata = {}
+    convert_jsonl_to_markdown(jsonl_file, output_path, metadata=metadata)
+    return metadata
+
 def convert_folder(folder_path, output_dir=None):
-    """Convert all JSONL files in a folder to markdown."""
+    """Convert all JSONL files in a folder to markdown.
+    
+    Returns the metadata of each converted log, for create_summary_from_metadata().
+    """
     folder_path = Path(folder_path)
     
     jsonl_files = list(folder_path.glob('*.jsonl'))
@@ -193,81 +328,100 @@ def convert_folder(folder_path, output_dir=None):
     
     print(f"Found {len(jsonl_files)} JSONL file(s)\n")
     
-    for jsonl_file in jsonl_files:
-        print(f"Processing {jsonl_file.name}...")
-        
-        if output_dir:
-            output_path = Path(output_dir) / jsonl_file.with_suffix('.md').name
-        else:
-            output_path = jsonl_file.with_suffix('.md')
-        
-        convert_jsonl_to_markdown(jsonl_file, output_path)
-        print()
+    # Files are independent, convert them in parallel worker processes
+    if len(jsonl_files) == 1:
+        meta_list = [_convert_one(jsonl_files[0], output_dir)]
+    else:
+        # imported here, the commit hook imports this module on every run
+        from concurrent.futures import ProcessPoolExecutor
+        max_workers = min(len(jsonl_files), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            meta_list = list(executor.map(
+                _convert_one, jsonl_files, [output_dir] * len(jsonl_files)))
+    print()
+    return meta_list
 
-def create_summary(folder_path, output_path=None, output_dir=None):
-    """Create a summary of all chat sessions."""
-    folder_path = Path(folder_path)
-    jsonl_files = list(folder_path.glob('*.jsonl'))
-    
-    if not jsonl_files:
-        print("No JSONL files found")
-        return
+def read_log_metadata(jsonl_file):
+    """Scan a JSONL chat log for the metadata shown in the summary."""
+    jsonl_file = Path(jsonl_file)
+    msg_count = 0
+    first_timestamp = None
+    last_timestamp = None
+    git_branch = None
+    
+    with open(jsonl_file, 'rb') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entry = json_loads(line)
+                if not is_noise_message(entry):
+                    msg_count += 1
+                    ts = entry.get('timestamp')
+                    if ts:
+                        if first_timestamp is None:
+                            first_timestamp = ts
+                        last_timestamp = ts
+                    if git_branch is None:
+                        git_branch = entry.get('gitBranch')
+            except:
+                continue
     
+    return {
+        'path': jsonl_file,
+        'stem': jsonl_file.stem,
+        'msg_count': msg_count,
+        'first_ts': first_timestamp,
+        'last_ts': last_timestamp,
+        'git_branch': git_branch,
+    }
+
+def summary_output_path(folder_path, output_path=None, output_dir=None):
+    """Determine where the sessions summary is written."""
+    if output_path is not None:
+        return Path(output_path)
+    if output_dir:
+        # If output directory specified, put summary there
+        return Path(output_dir) / "CHAT_SESSIONS_SUMMARY.md"
+    # Otherwise put in input folder
+    return Path(folder_path) / "CHAT_SESSIONS_SUMMARY.md"
+
+def create_summary_from_metadata(meta_list, output_path):
+    """Create a summary of chat sessions from per-log metadata dicts."""
     summary_lines = ["# Chat Sessions Summary\n"]
     summary_lines.append(f"**Generated**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-    summary_lines.append(f"**Total Sessions**: {len(jsonl_files)}\n")
+    summary_lines.append(f"**Total Sessions**: {len(meta_list)}\n")
     summary_lines.append("---\n")
     
-    for jsonl_file in sorted(jsonl_files):
-        # Count messages
-        msg_count = 0
-        first_timestamp = None
-        last_timestamp = None
-        git_branch = None
-        
-        with open(jsonl_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                if not line.strip():
-                    continue
-                try:
-                    entry = json.loads(line)
-                    if not is_noise_message(entry):
-                        msg_count += 1
-                        ts = entry.get('timestamp')
-                        if ts:
-                            if first_timestamp is None:
-                                first_timestamp = ts
-                            last_timestamp = ts
-                        if git_branch is None:
-                            git_branch = entry.get('gitBranch')
-                except:
-                    continue
-        
-        summary_lines.append(f"## {jsonl_file.stem}\n")
-        summary_lines.append(f"- **File**: `{jsonl_file.name}`")
-        summary_lines.append(f"- **Messages**: {msg_count}")
-        if git_branch:
-            summary_lines.append(f"- **Branch**: `{git_branch}`")
-        if first_timestamp:
-            summary_lines.append(f"- **Started**: {parse_timestamp(first_timestamp)}")
-        if last_timestamp:
-            summary_lines.append(f"- **Ended**: {parse_timestamp(last_timestamp)}")
+    for meta in sorted(meta_list, key=lambda m: m['path']):
+        summary_lines.append(f"## {meta['stem']}\n")
+        summary_lines.append(f"- **File**: `{meta['path'].name}`")
+        summary_lines.append(f"- **Messages**: {meta['msg_count']}")
+        if meta['git_branch']:
+            summary_lines.append(f"- **Branch**: `{meta['git_branch']}`")
+        if meta['first_ts']:
+            summary_lines.append(f"- **Started**: {parse_timestamp(meta['first_ts'])}")
+        if meta['last_ts']:
+            summary_lines.append(f"- **Ended**: {parse_timestamp(meta['last_ts'])}")
         summary_lines.append("")
     
-    # Determine output location
-    if output_path is None:
-        if output_dir:
-            # If output directory specified, put summary there
-            output_path = Path(output_dir) / "CHAT_SESSIONS_SUMMARY.md"
-        else:
-            # Otherwise put in input folder
-            output_path = folder_path / "CHAT_SESSIONS_SUMMARY.md"
-    else:
-        output_path = Path(output_path)
-    
+    output_path = Path(output_path)
     output_path.write_text('\n'.join(summary_lines), encoding='utf-8')
     print(f"Summary saved to {output_path}")
 
+def create_summary(folder_path, output_path=None, output_dir=None):
+    """Create a summary of all chat sessions."""
+    folder_path = Path(folder_path)
+    jsonl_files = list(folder_path.glob('*.jsonl'))
+    
+    if not jsonl_files:
+        print("No JSONL files found")
+        return
+    
+    meta_list = [read_log_metadata(jsonl_file) for jsonl_file in jsonl_files]
+    create_summary_from_metadata(
+        meta_list, summary_output_path(folder_path, output_path, output_dir))
+
 if __name__ == "__main__":
     import sys
     
@@ -295,5 +449,8 @@ if __name__ == "__main__":
         if create_summary_flag:
             create_summary(input_path, output_dir=output_dir)
         else:
-            convert_folder(input_path, output_dir)
-            create_summary(input_path, output_dir=output_dir)
\ No newline at end of file
+            meta_list = convert_folder(input_path, output_dir)
+            if meta_list:
+                # Summary from the metadata gathered during conversion, no re-parse
+                create_summary_from_metadata(
+                    meta_list, summary_output_path(input_path, output_dir=output_dir))
\ No newline at end of file
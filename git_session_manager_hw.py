@@ -1,8 +1,19 @@
+import os
+import re
+import json
+import time
 import subprocess
-import datetime
+import configparser
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from ScopeFoundry import HardwareComponent
 
+try:
+    # Optional: read repository state in-process instead of spawning git
+    import pygit2
+except ImportError:
+    pygit2 = None
+
 
 class GitSessionManagerHW(HardwareComponent):
     """
@@ -17,6 +28,62 @@ class GitSessionManagerHW(HardwareComponent):
     name = "git_session_manager"
     SESSION_PREFIX = "session"
     
+    # git subcommands that leave HEAD, the index and the working tree alone
+    _READ_ONLY_COMMANDS = frozenset({'status', 'rev-parse', 'for-each-ref', 'config', 'diff', 'log', 'show-ref'})
+    # seconds a status scan may be reused by refresh_git_status(use_cache=True)
+    _STATUS_CACHE_TTL = 1.0
+    
+    # Session name cleaning for branch names: spaces and underscores become
+    # dashes, then anything but letters, digits, "-" and "." is dropped
+    _BRANCH_DASHES = str.maketrans({' ': '-', '_': '-'})
+    _BRANCH_INVALID_RE = re.compile(r'[^\w.-]')
+    
+    # Commit and tag message templates, filled in by _render_message()
+    _TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+    _MSG_SIGNATURE = "\n\nGenerated with ScopeFoundry Git Session Manager"
+    _MSG_TEMPLATES = {
+        "start": (
+            "Start: {branch}\n\n"
+            "Session Details:\n"
+            "- Branch: {branch}\n"
+            "- Started: {timestamp}\n"
+            "- ScopeFoundry Git Session Manager" + _MSG_SIGNATURE
+        ),
+        "initial": (
+            "Initial state for: {branch}\n\n"
+            "Session Details:\n"
+            "- Branch: {branch}\n"
+            "- Started: {timestamp}\n"
+            "- ScopeFoundry Git Session Manager" + _MSG_SIGNATURE
+        ),
+        "tag": (
+            "Session {tag_type} tag for: {branch}\n\n"
+            "Tag Details:\n"
+            "- Branch: {branch}\n"
+            "- Created: {timestamp}\n"
+            "- ScopeFoundry Git Session Manager" + _MSG_SIGNATURE
+        ),
+        "progress": (
+            "Progress commit: {branch}\n\n"
+            "Updated at: {timestamp}" + _MSG_SIGNATURE
+        ),
+        "submodule_progress": (
+            "Progress: {branch}\n\n"
+            "Updated at: {timestamp}" + _MSG_SIGNATURE
+        ),
+        "final": (
+            "Final commit: {branch}\n\n"
+            "Session completed at: {timestamp}" + _MSG_SIGNATURE
+        ),
+        "measurement": (
+            "Starting measurement: {measurement}\n\n"
+            "Measurement Details:\n"
+            "- Name: {measurement}\n"
+            "- Started: {timestamp}\n"
+            "- Session: {session}" + _MSG_SIGNATURE
+        ),
+    }
+    
     def setup(self):
         """Set up the git session manager settings and operations"""
         
@@ -107,8 +174,36 @@ class GitSessionManagerHW(HardwareComponent):
         self.add_operation("Return to Parent Branch", self.return_to_parent_branch)
         self.add_operation("Refresh Status", self.refresh_git_status)
         
+        # pygit2 repository handle for read-only queries, opened in connect()
+        self._repo = None
+        
+        # get_submodules() cache, invalidated by .gitmodules mtime
+        self._submodules_cache = None
+        self._submodules_mtime = 0
+        
+        # parsed packed-refs per git dir, {path: (mtime, {ref: hash})}
+        self._packed_refs_cache = {}
+        
+        # background worker for fire-and-forget git operations (session tags),
+        # and the future of the last one submitted
+        self._bg = None
+        self._bg_pending = None
+        
+        # (fingerprint, scan time, status) of the last refresh_git_status() scan
+        self._status_cache = None
+        
+        # repo_path resolved once into the working directory and git dir,
+        # re-resolved whenever the setting changes
+        self._cwd = None
+        self._gitdir = None
+        self._resolve_repo_path()
+        self.repo_path.add_listener(self._resolve_repo_path)
+        
     def connect(self):
         """Connect to git and initialize status"""
+        self._resolve_repo_path()
+        self._repo = self._open_repo()
+        self._bg = ThreadPoolExecutor(max_workers=1)
         self.refresh_git_status()
         
         for measure_name, measure in self.app.measurements.items():
@@ -119,105 +214,377 @@ class GitSessionManagerHW(HardwareComponent):
     def disconnect(self):
         """Disconnect from git session manager"""
         # TODO should the session end on disconnect?
-        pass
+        if self._bg is not None:
+            # let a pending session tag finish before letting go
+            self._bg.shutdown(wait=True)
+            self._bg = None
+            self._bg_pending = None
+        self._repo = None
         
-    def _run_git_command(self, cmd, check=True, silent_fail=False, input_text=None):
-        """Execute a git command and return the result"""
-        try:
-            result = subprocess.run(
-                cmd,
-                cwd=self.repo_path.val,
-                capture_output=True,
-                text=True,
-                check=check,
-                input=input_text
-            )
-            return result.stdout.strip(), result.stderr.strip(), result.returncode
-        except subprocess.CalledProcessError as e:
+    def _run_git_command(self, cmd, check=False, silent_fail=False, input_text=None, readonly=None, capture=True,
+                         background=False):
+        """Execute a git command and return (stdout, stderr, returncode)
+        
+        Failures are only raised with check=True, otherwise callers inspect
+        the return code themselves (e.g. "nothing to commit" is not an error).
+        
+        readonly: run with --no-optional-locks so git does not take index.lock
+        to refresh the index, defaults to whether the subcommand is in
+        _READ_ONLY_COMMANDS
+        
+        capture: set to False for commands whose output is not used, stdout
+        is then discarded and returned as "" (stderr is kept for errors)
+        
+        background: set for commands run on the _bg worker, which may only
+        write refs (e.g. git tag). These leave the cached status valid, so
+        they neither drop it nor wait for the background work (themselves).
+        """
+        if readonly is None:
+            readonly = cmd[1] in self._READ_ONLY_COMMANDS
+        modifies_status = not readonly and not background
+        if modifies_status:
+            # A session tag still running in the background holds ref locks
+            self._wait_for_background()
+        if readonly:
+            # Probes then neither contend with other git processes nor write
+            # to the repository, which is slow on network filesystems
+            cmd = [cmd[0], '--no-optional-locks', *cmd[1:]]
+        
+        proc = subprocess.run(
+            cmd,
+            cwd=self._cwd,
+            stdout=subprocess.PIPE if capture else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            input=input_text
+        )
+        result = ((proc.stdout or "").strip(), proc.stderr.strip(), proc.returncode)
+        if modifies_status:
+            self._repository_modified()
+        if check:
+            self._require_ok(result, cmd, silent_fail=silent_fail)
+        return result
+    
+    def _wait_for_background(self):
+        """Block until the last background git operation has finished"""
+        pending, self._bg_pending = self._bg_pending, None
+        if pending is not None:
+            # create_session_tag logs its own failures
+            pending.exception()
+    
+    def _repository_modified(self):
+        """Drop the cached status after this component changed the repository"""
+        self._status_cache = None
+    
+    def _require_ok(self, result, cmd, silent_fail=False):
+        """Raise CalledProcessError if the git command result has a non-zero return code"""
+        stdout, stderr, returncode = result
+        if returncode != 0:
             if not silent_fail:
                 self.log.error(f"Git command failed: {' '.join(cmd)}")
-                self.log.error(f"Error: {e.stderr}")
-                self.log.error(f"Return code: {e.returncode}")
-            raise
+                self.log.error(f"Error: {stderr}")
+                self.log.error(f"Return code: {returncode}")
+            raise subprocess.CalledProcessError(returncode, cmd, output=stdout, stderr=stderr)
+        return result
+            
+    def _render_message(self, kind, branch="", **fields):
+        """Build a commit or tag message from the template for the given kind"""
+        if 'timestamp' not in fields:
+            fields['timestamp'] = time.strftime(self._TIMESTAMP_FORMAT)
+        return self._MSG_TEMPLATES[kind].format(branch=branch, **fields)
+            
+    def _resolve_repo_path(self):
+        """Cache the repository top level and git dir used by every git call
+        
+        repo_path may be any directory inside the working tree, git finds the
+        top level and the git dir (linked worktrees and submodules included).
+        """
+        path = Path(self.repo_path.val).resolve()
+        try:
+            proc = subprocess.run(
+                ['git', 'rev-parse', '--show-toplevel', '--absolute-git-dir'],
+                cwd=path, capture_output=True, text=True
+            )
+            lines = proc.stdout.splitlines() if proc.returncode == 0 else []
+        except OSError:
+            lines = []
+        if len(lines) == 2:
+            self._cwd, self._gitdir = Path(lines[0]), Path(lines[1])
+        else:
+            # Not a repository (yet), git commands will report the error
+            self._cwd = path
+            self._gitdir = self._find_gitdir(path)
+        
+        # Anything derived from the old repository is stale
+        self._submodules_cache = None
+        self._status_cache = None
+        if self._repo is not None:
+            self._repo = self._open_repo()
+    
+    def _find_gitdir(self, worktree):
+        """Get the git dir of a working tree"""
+        gitdir = worktree / '.git'
+        if gitdir.is_file():
+            # Worktrees and submodules have a .git file pointing at the real git dir
+            content = gitdir.read_text().strip()
+            if content.startswith('gitdir:'):
+                gitdir = (worktree / content[len('gitdir:'):].strip()).resolve()
+        return gitdir
+    
+    def _read_head(self, gitdir=None):
+        """Read HEAD from the git dir files without running git
+        
+        Returns (branch, commit hash), branch is None for a detached HEAD
+        and the hash is "" on a branch without commits.
+        """
+        gitdir = gitdir or self._gitdir
+        head = (gitdir / 'HEAD').read_text().strip()
+        if not head.startswith('ref: '):
+            return None, head
+        
+        ref = head[len('ref: '):]
+        branch = ref[len('refs/heads/'):] if ref.startswith('refs/heads/') else ref
+        
+        gitdir = self._common_gitdir(gitdir)
+        try:
+            return branch, (gitdir / ref).read_text().strip()
+        except FileNotFoundError:
+            # Not a loose ref, it was packed by git gc (or the branch is unborn)
+            return branch, self._read_packed_refs(gitdir).get(ref, "")
+    
+    def _common_gitdir(self, gitdir):
+        """Get the git dir holding the branches, linked worktrees share the main one"""
+        commondir = gitdir / 'commondir'
+        if commondir.is_file():
+            return (gitdir / commondir.read_text().strip()).resolve()
+        return gitdir
+    
+    def _read_packed_refs(self, gitdir):
+        """Get {ref: hash} from the packed-refs file, re-parsed only when it changes"""
+        packed_refs = gitdir / 'packed-refs'
+        try:
+            mtime = packed_refs.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        
+        cached = self._packed_refs_cache.get(packed_refs)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        
+        refs = {}
+        with open(packed_refs) as f:
+            for line in f:
+                # Skip the header and the peeled "^hash" lines of annotated tags
+                if line[0] in '#^':
+                    continue
+                commit_hash, _, ref = line.rstrip('\n').partition(' ')
+                refs[ref] = commit_hash
+        self._packed_refs_cache[packed_refs] = (mtime, refs)
+        return refs
+    
+    def _open_repo(self):
+        """Open a pygit2 repository for read-only queries, if pygit2 is available"""
+        if pygit2 is None:
+            return None
+        try:
+            return pygit2.Repository(str(self._cwd))
+        except Exception as e:
+            self.log.warning(f"pygit2 could not open {self.repo_path.val}, using git commands: {e}")
+            return None
             
     def get_submodules(self):
         """Get list of submodules in the repository"""
         try:
-            stdout, _, _ = self._run_git_command(
-                ['git', 'config', '--file', '.gitmodules', '--get-regexp', 'path'],
-                check=False
-            )
-            
-            if not stdout:
+            gitmodules = self._cwd / '.gitmodules'
+            try:
+                mtime = gitmodules.stat().st_mtime_ns
+            except FileNotFoundError:
                 return []
             
-            submodules = []
-            for line in stdout.splitlines():
-                if line.strip():
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        submodule_path = parts[1]
-                        submodules.append(submodule_path)
+            # The submodule list only changes when .gitmodules does
+            if self._submodules_cache is None or mtime != self._submodules_mtime:
+                self._submodules_cache = self._read_gitmodules(gitmodules)
+                self._submodules_mtime = mtime
             
-            return submodules
+            return list(self._submodules_cache)
             
         except Exception as e:
             self.log.error(f"Failed to get submodules: {e}")
             return []
     
-    def refresh_git_status(self):
-        """Refresh git status information"""
+    def _read_gitmodules(self, gitmodules):
+        """Read submodule paths from a .gitmodules file"""
+        # .gitmodules is an INI file, parse it directly rather than calling git.
+        # configparser keeps quotes, inline ; or # comments and backslash
+        # escapes in values where git strips or unescapes them, so git reads
+        # any file with such a path value.
+        parser = configparser.ConfigParser(interpolation=None, strict=False)
         try:
-            # Get current branch
-            stdout, stderr, returncode = self._run_git_command(
-                ['git', 'rev-parse', '--abbrev-ref', 'HEAD']
-            )
-            self.current_branch.update_value(stdout)
-            
-            # Get current commit hash
-            stdout, stderr, returncode = self._run_git_command(
-                ['git', 'rev-parse', 'HEAD']
-            )
-            self.current_commit_hash.update_value(stdout)
-            
-            # Check for uncommitted changes
-            cmd = ['git', 'status', '--porcelain']
-            if not self.manage_submodules.val:
-                cmd.append('--ignore-submodules')
-            stdout, _, _ = self._run_git_command(cmd)
-            has_changes = bool(stdout.strip())
-            self.has_uncommitted_changes.update_value(has_changes)
-            
-            # Update session status
-            current_branch = self.current_branch.val
-            is_session_branch = current_branch.startswith(f"{self.SESSION_PREFIX}-")
-            
-            # Session is active if on a session branch
-            session_active = is_session_branch
-            self.session_active.update_value(session_active)
-            
-            if is_session_branch:
-                self.session_branch.update_value(current_branch)
+            parser.read(gitmodules, encoding='utf-8')
+            paths = [parser[section]['path'] for section in parser.sections()
+                     if 'path' in parser[section]]
+            if not any(char in path for path in paths for char in '";#\\'):
+                return paths
+        except configparser.Error as e:
+            self.log.warning(f"Could not parse {gitmodules}, asking git instead: {e}")
+        
+        stdout, _, _ = self._run_git_command(
+            ['git', 'config', '--file', '.gitmodules', '--get-regexp', 'path']
+        )
+        
+        submodules = []
+        for line in stdout.splitlines():
+            if line.strip():
+                parts = line.split(maxsplit=1)
+                if len(parts) >= 2:
+                    submodule_path = parts[1]
+                    submodules.append(submodule_path)
+        
+        return submodules
+    
+    def _parse_porcelain_v2(self, stdout):
+        """Parse `git status --porcelain=v2 --branch` output into a dict"""
+        status = {'branch': "", 'commit_hash': "", 'has_changes': False}
+        for line in stdout.splitlines():
+            if line.startswith('# branch.head '):
+                branch = line[len('# branch.head '):]
+                # match `git rev-parse --abbrev-ref HEAD` for detached heads
+                status['branch'] = "HEAD" if branch == "(detached)" else branch
+            elif line.startswith('# branch.oid '):
+                oid = line[len('# branch.oid '):]
+                status['commit_hash'] = "" if oid == "(initial)" else oid
+            elif line and not line.startswith('#'):
+                status['has_changes'] = True
+        return status
+    
+    def _read_status_pygit2(self):
+        """Read branch, commit hash and uncommitted changes through pygit2"""
+        repo = self._repo
+        status = {'branch': "", 'commit_hash': "", 'has_changes': False}
+        if repo.head_is_unborn:
+            # no commits yet, HEAD is a symbolic ref to the unborn branch
+            status['branch'] = repo.references['HEAD'].target.split('refs/heads/', 1)[-1]
+        else:
+            head = repo.head
+            status['branch'] = "HEAD" if repo.head_is_detached else head.shorthand
+            status['commit_hash'] = str(head.target)
+        
+        changes = repo.status()
+        if changes and not self.manage_submodules.val:
+            # equivalent of `git status --ignore-submodules`
+            submodules = set(self.get_submodules())
+            status['has_changes'] = any(path not in submodules for path in changes)
+        else:
+            status['has_changes'] = bool(changes)
+        return status
+    
+    def _status_fingerprint(self):
+        """Modification time of the index and the current branch and commit, None if they cannot be read"""
+        try:
+            return ((self._gitdir / 'index').stat().st_mtime_ns, self._read_head())
+        except OSError:
+            return None
+    
+    def refresh_git_status(self, use_cache=False):
+        """Refresh git status information
+        
+        use_cache: reuse the last scan if it is less than _STATUS_CACHE_TTL old,
+        no git command changed the repository since and the index and HEAD are
+        untouched. Edits to working tree files do not touch the index, so this
+        is only for back-to-back refreshes within one operation.
+        """
+        try:
+            cache = self._status_cache
+            if (use_cache and cache is not None
+                    and cache[0] == self._status_fingerprint()
+                    and time.monotonic() - cache[1] < self._STATUS_CACHE_TTL):
+                status = cache[2]
             else:
-                self.session_branch.update_value("")
+                if self._repo is not None:
+                    status = self._read_status_pygit2()
+                else:
+                    # Branch, commit hash and uncommitted changes in a single call
+                    cmd = ['git', 'status', '--porcelain=v2', '--branch']
+                    if not self.manage_submodules.val:
+                        cmd.append('--ignore-submodules')
+                    stdout, _, _ = self._run_git_command(cmd, check=True)
+                    status = self._parse_porcelain_v2(stdout)
+                self._cache_status(status)
+            
+            current_branch = status['branch']
+            has_changes = status['has_changes']
+            self._update_status(current_branch, status['commit_hash'], has_changes)
                 
             self.log.info(f"Git status refreshed - Branch: {current_branch}, Changes: {has_changes}")
             
         except Exception as e:
             self.log.error(f"Failed to refresh git status: {e}")
+    
+    def _cache_status(self, status):
+        """Keep a status for refresh_git_status(use_cache=True)"""
+        # Taken after the scan (or commit) in case something else refreshed the index meanwhile
+        fingerprint = self._status_fingerprint()
+        if fingerprint is not None:
+            self._status_cache = (fingerprint, time.monotonic(), status)
+    
+    def _update_status(self, current_branch, commit_hash, has_changes):
+        """Set the status settings from a known repository state"""
+        self.current_branch.update_value(current_branch)
+        self.current_commit_hash.update_value(commit_hash)
+        self.has_uncommitted_changes.update_value(has_changes)
+        
+        # Update session status
+        is_session_branch = current_branch.startswith(self.SESSION_PREFIX + "-")
+        
+        # Session is active if on a session branch
+        session_active = is_session_branch
+        self.session_active.update_value(session_active)
+        
+        if is_session_branch:
+            self.session_branch.update_value(current_branch)
+        else:
+            self.session_branch.update_value("")
+    
+    def _read_head_commit(self):
+        """Get the commit hash HEAD points to"""
+        if self._repo is not None:
+            return str(self._repo.head.target)
+        return self._read_head()[1]
+    
+    def _status_after_commit(self, branch_name):
+        """Update the status after committing everything on branch_name
+        
+        `git add -A` + commit leaves the tree clean, so only the new commit hash
+        has to be read. Dirty submodule working trees are not committed by the
+        parent and still show up as changes, so those need a full refresh.
+        The status is cached either way, so that a refresh right after the
+        commit (as in end_experimental_session) reuses it.
+        """
+        if self.manage_submodules.val:
+            self.refresh_git_status()
+            return
+        try:
+            commit_hash = self._read_head_commit()
+            self._update_status(branch_name, commit_hash, False)
+            self._cache_status({'branch': branch_name, 'commit_hash': commit_hash, 'has_changes': False})
+        except Exception as e:
+            self.log.warning(f"Could not read new HEAD, refreshing status instead: {e}")
+            self.refresh_git_status()
             
-    def generate_session_branch_name(self, session_name=None):
-        """Generate a branch name for the experimental session"""
+    def generate_session_branch_name(self, session_name=None, now=None):
+        """Generate a branch name for the experimental session
+        
+        now: time.struct_time of the session start, defaults to the current time
+        """
         if session_name is None:
             session_name = self.session_name.val
         
         # Always include timestamp
-        timestamp = datetime.datetime.now().strftime("%y%m%d-%H%M%S")
+        timestamp = time.strftime("%y%m%d-%H%M%S", now or time.localtime())
         
         if session_name:
             # Clean session name for git branch
-            clean_name = session_name.replace(" ", "-").replace("_", "-")
-            clean_name = "".join(c for c in clean_name if c.isalnum() or c in "-.")
+            clean_name = self._BRANCH_INVALID_RE.sub('', session_name.translate(self._BRANCH_DASHES))
             # Update the LQ with cleaned name
             self.session_name.update_value(clean_name)
             branch_name = f"{self.SESSION_PREFIX}-{timestamp}-{clean_name}"
@@ -227,6 +594,17 @@ class GitSessionManagerHW(HardwareComponent):
         
         return branch_name
         
+    def get_session_branches(self):
+        """Get the set of local session branch names"""
+        if self._repo is not None:
+            prefix = f"{self.SESSION_PREFIX}-"
+            return {name for name in self._repo.branches.local if name.startswith(prefix)}
+        stdout, _, _ = self._run_git_command(
+            ['git', 'for-each-ref', '--format=%(refname:lstrip=2)', f'refs/heads/{self.SESSION_PREFIX}-*'],
+            check=True
+        )
+        return set(stdout.splitlines())
+        
     def start_experimental_session(self):
         """Start a new experimental session by creating and switching to a new git branch"""
         try:
@@ -239,23 +617,20 @@ class GitSessionManagerHW(HardwareComponent):
             self.parent_branch.update_value(parent_branch)
                 
             # Generate branch name
-            branch_name = self.generate_session_branch_name()
+            # One timestamp for the branch name, start commit and tag of this session
+            now = time.localtime()
+            timestamp = time.strftime(self._TIMESTAMP_FORMAT, now)
+            
+            branch_name = self.generate_session_branch_name(now=now)
             
             # Check if branch already exists and increment if needed
+            existing_branches = self.get_session_branches()
             original_branch_name = branch_name
             counter = 1
-            while True:
-                _, _, returncode = self._run_git_command(
-                    ['git', 'show-ref', '--verify', '--quiet', f'refs/heads/{branch_name}'],
-                    check=False
-                )
-                if returncode == 0:
-                    # Branch exists, try next number
-                    branch_name = f"{original_branch_name}-{counter}"
-                    counter += 1
-                else:
-                    # Branch doesn't exist, use this name
-                    break
+            while branch_name in existing_branches:
+                # Branch exists, try next number
+                branch_name = f"{original_branch_name}-{counter}"
+                counter += 1
             
             # Update session_name if branch name was modified
             if branch_name != original_branch_name:
@@ -263,7 +638,7 @@ class GitSessionManagerHW(HardwareComponent):
                 self.session_name.update_value(session_name_from_branch)
                 
             # Create and switch to new branch
-            self._run_git_command(['git', 'checkout', '-b', branch_name])
+            self._run_git_command(['git', 'checkout', '-b', branch_name], check=True, capture=False)
             
             # Reset session_ended flag for new session (kept for backward compatibility)
             # self.session_ended.update_value(False)
@@ -272,14 +647,27 @@ class GitSessionManagerHW(HardwareComponent):
             if self.manage_submodules.val:
                 self.start_session_in_submodules(branch_name, parent_branch)
             
-            # Commit initial state
-            self.commit_initial_session_state(branch_name)
-            
-            # Create tag for session start
-            self.create_session_tag(branch_name)
+            # Commit initial state, reusing the refreshed working tree status
+            self.refresh_git_status()
+            committed = self.commit_initial_session_state(
+                branch_name, has_changes=self.has_uncommitted_changes.val, timestamp=timestamp)
             
             # Update status
-            self.refresh_git_status()
+            if committed:
+                self._status_after_commit(branch_name)
+            else:
+                self.refresh_git_status()
+            
+            # Create tag for session start in the background, a failed tag is
+            # only logged so there is no need to wait for it. The tag is pinned
+            # to the session start commit in case HEAD moves before it runs, and
+            # the next repository-changing command waits for it to finish.
+            session_start_commit = self.current_commit_hash.val or None
+            if self._bg is not None:
+                self._bg_pending = self._bg.submit(self.create_session_tag, branch_name,
+                                                   commit=session_start_commit, timestamp=timestamp)
+            else:
+                self.create_session_tag(branch_name, commit=session_start_commit, timestamp=timestamp)
             
             self.log.info(f"Started experimental session on branch: {branch_name}")
             
@@ -289,6 +677,8 @@ class GitSessionManagerHW(HardwareComponent):
             
     def start_session_in_submodules(self, branch_name, parent_branch):
         """Create session branches in all submodules, recording their parent branches in the commit message"""
+        if not self.manage_submodules.val:
+            return
         try:
             submodules = self.get_submodules()
             
@@ -296,133 +686,125 @@ class GitSessionManagerHW(HardwareComponent):
                 self.log.info("No submodules found")
                 return
             
-            submodule_parent_branches = {}
-            
-            for submodule_path in submodules:
-                try:
-                    submodule_full_path = Path(self.repo_path.val) / submodule_path
-                    
-                    self.log.info(f"Creating session branch in submodule: {submodule_path}")
-                    
-                    # Get current branch in submodule
-                    result = subprocess.run(
-                        ['git', 'rev-parse', '--abbrev-ref', 'HEAD'],
-                        cwd=submodule_full_path,
-                        capture_output=True,
-                        text=True,
-                        check=True
-                    )
-                    submodule_current_branch = result.stdout.strip()
-                    submodule_parent_branches[submodule_path] = submodule_current_branch
-                    
-                    # Create and switch to new branch in submodule
-                    subprocess.run(
-                        ['git', 'checkout', '-b', branch_name],
-                        cwd=submodule_full_path,
-                        capture_output=True,
-                        text=True,
-                        check=True
-                    )
-                    
-                    self.log.info(f"Created branch {branch_name} in submodule {submodule_path} (was on {submodule_current_branch})")
-                    
-                except subprocess.CalledProcessError as e:
-                    self.log.warning(f"Failed to create session branch in submodule {submodule_path}: {e.stderr}")
-                except Exception as e:
-                    self.log.warning(f"Failed to process submodule {submodule_path}: {e}")
+            # Submodules are independent working trees, branch them in parallel
+            results = self._map_submodules(self._create_branch_in_submodule, submodules, branch_name)
+            submodule_parent_branches = {
+                submodule_path: submodule_current_branch
+                for submodule_path, submodule_current_branch in zip(submodules, results)
+                if submodule_current_branch is not None
+            }
             
             # Store submodule parent branches in a file
             if submodule_parent_branches:
-                parent_branches_file = Path(self.repo_path.val) / '.git' / 'session_submodule_parents.txt'
-                with open(parent_branches_file, 'w') as f:
-                    for path, branch in submodule_parent_branches.items():
-                        f.write(f"{path}:{branch}\n")
+                # Write to a temporary file and swap it in so a reader never sees a partial file
+                parent_branches_file = self._gitdir / 'session_submodule_parents.json'
+                tmp_file = parent_branches_file.with_suffix('.json.tmp')
+                tmp_file.write_text(json.dumps(submodule_parent_branches))
+                os.replace(tmp_file, parent_branches_file)
                     
         except Exception as e:
             self.log.error(f"Failed to start session in submodules: {e}")
     
-    def commit_initial_session_state(self, branch_name):
-        """Commit the initial state when starting a session"""
+    def _map_submodules(self, func, submodules, *args):
+        """Run func(submodule_path, *args) for each submodule on a thread pool, results in order"""
+        if len(submodules) == 1:
+            return [func(submodules[0], *args)]
+        max_workers = min(len(submodules), max(4, (os.cpu_count() or 1) * 3 // 4))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda submodule_path: func(submodule_path, *args), submodules))
+    
+    def _create_branch_in_submodule(self, submodule_path, branch_name):
+        """Create and switch to the session branch in one submodule, returning its previous branch"""
         try:
-            # Check if there are any changes to commit first
-            stdout, stderr, returncode = self._run_git_command(
-                ['git', 'status', '--porcelain'], 
-                check=False
+            submodule_full_path = self._cwd / submodule_path
+            
+            self.log.info(f"Creating session branch in submodule: {submodule_path}")
+            
+            # Get current branch in submodule ("HEAD" when detached, like `git rev-parse --abbrev-ref HEAD`)
+            submodule_current_branch, _ = self._read_head(self._find_gitdir(submodule_full_path))
+            submodule_current_branch = submodule_current_branch or "HEAD"
+            
+            # Create and switch to new branch in submodule
+            subprocess.run(
+                ['git', 'checkout', '-b', branch_name],
+                cwd=submodule_full_path,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                text=True,
+                check=True
             )
             
-            if not stdout.strip():
+            self.log.info(f"Created branch {branch_name} in submodule {submodule_path} (was on {submodule_current_branch})")
+            return submodule_current_branch
+            
+        except subprocess.CalledProcessError as e:
+            self.log.warning(f"Failed to create session branch in submodule {submodule_path}: {e.stderr}")
+        except Exception as e:
+            self.log.warning(f"Failed to process submodule {submodule_path}: {e}")
+        return None
+    
+    def commit_initial_session_state(self, branch_name, has_changes=None, timestamp=None):
+        """Commit the initial state when starting a session, returns whether a commit was made
+        
+        has_changes: whether the working tree has uncommitted changes,
+        defaults to the has_uncommitted_changes setting
+        timestamp: session start time for the commit message, defaults to now
+        """
+        try:
+            if timestamp is None:
+                timestamp = time.strftime(self._TIMESTAMP_FORMAT)
+            
+            if has_changes is None:
+                has_changes = self.has_uncommitted_changes.val
+            
+            if not has_changes:
                 # No changes to commit, create an empty commit to mark session start
-                timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                
-                commit_message = f"""Start: {branch_name}
-
-Session Details:
-- Branch: {branch_name}
-- Started: {timestamp}
-- ScopeFoundry Git Session Manager
+                commit_message = self._render_message("start", branch_name, timestamp=timestamp)
 
-Generated with ScopeFoundry Git Session Manager"""
-
-                self._run_git_command(['git', 'commit', '--allow-empty', '-F', '-'], input_text=commit_message)
+                self._run_git_command(['git', 'commit', '--allow-empty', '-F', '-'], check=True, input_text=commit_message, capture=False)
                 self.log.info(f"Created empty commit to mark session start for {branch_name}")
+                return True
             else:
                 # There are changes, add and commit them
-                self._run_git_command(['git', 'add', '-A'])
+                self._run_git_command(['git', 'add', '-A'], check=True, capture=False)
                 
                 # Check if there are actually staged changes after add
-                _, _, returncode = self._run_git_command(
-                    ['git', 'diff', '--cached', '--quiet'],
-                    check=False
-                )
+                _, _, returncode = self._run_git_command(['git', 'diff', '--cached', '--quiet'], capture=False)
                 
                 # git diff --cached --quiet returns 1 if there are staged changes, 0 if none
                 if returncode == 0:
                     # Nothing was actually staged (e.g., all files ignored or submodule changes)
                     self.log.info("No changes to commit after git add (files may be ignored or only submodule changes)")
-                    return
-                
-                timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    return False
                 
-                commit_message = f"""Initial state for: {branch_name}
+                commit_message = self._render_message("initial", branch_name, timestamp=timestamp)
 
-Session Details:
-- Branch: {branch_name}
-- Started: {timestamp}
-- ScopeFoundry Git Session Manager
-
-Generated with ScopeFoundry Git Session Manager"""
-
-                self._run_git_command(['git', 'commit', '-F', '-'], input_text=commit_message)
+                self._run_git_command(['git', 'commit', '-F', '-'], check=True, input_text=commit_message, capture=False)
+                
                 self.log.info(f"Committed initial session state for {branch_name}")
+                return True
             
         except subprocess.CalledProcessError as e:
-            self.log.error(f"Git commit failed with return code {e.returncode}")
-            self.log.error(f"Git stderr: {e.stderr}")
             self.log.error(f"Git stdout: {e.stdout}")
-            if "nothing to commit" in str(e.stderr):
-                self.log.info("No changes to commit for initial session state")
-            else:
-                self.log.error(f"Failed to commit initial session state: {e}")
-                raise
+            self.log.error(f"Failed to commit initial session state: {e}")
+            raise
                 
-    def create_session_tag(self, branch_name, tag_type="start"):
-        """Create a git tag to mark the session start or end"""
+    def create_session_tag(self, branch_name, tag_type="start", commit=None, timestamp=None):
+        """Create a git tag to mark the session start or end, on commit (default HEAD)"""
         try:
             tag_name = f"{tag_type}-{branch_name}"
             
             # Create tag message
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            tag_message = f"""Session {tag_type} tag for: {branch_name}
-
-Tag Details:
-- Branch: {branch_name}
-- Created: {timestamp}
-- ScopeFoundry Git Session Manager
-
-Generated with ScopeFoundry Git Session Manager"""
+            fields = {'timestamp': timestamp} if timestamp else {}
+            tag_message = self._render_message("tag", branch_name, tag_type=tag_type, **fields)
 
             # Create annotated tag
-            self._run_git_command(['git', 'tag', '-a', tag_name, '-m', tag_message])
+            cmd = ['git', 'tag', '-a', tag_name, '-m', tag_message]
+            if commit:
+                cmd.append(commit)
+            # background: this may run on the _bg worker, which must not touch
+            # the cached status (a tag leaves it valid anyway)
+            self._run_git_command(cmd, check=True, capture=False, background=True)
             
             self.log.info(f"Created session tag: {tag_name}")
             
@@ -448,8 +830,9 @@ Generated with ScopeFoundry Git Session Manager"""
             # Mark session as ended (but stay on the session branch)
             # self.session_ended.update_value(True)
             
-            # Update status (session will be marked inactive due to session_ended flag)
-            self.refresh_git_status()
+            # Update status (session will be marked inactive due to session_ended flag),
+            # the final commit above has usually just scanned the tree
+            self.refresh_git_status(use_cache=True)
             
             self.log.info(f"Ended experimental session on branch: {current_session_branch} (branch preserved)")
             
@@ -459,35 +842,57 @@ Generated with ScopeFoundry Git Session Manager"""
             
     def commit_submodule_changes(self, final=False):
         """Commit changes in all submodules"""
+        if not self.manage_submodules.val:
+            return
         try:
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            submodules = self.get_submodules()
+            if not submodules:
+                return
+            
             branch_name = self.session_branch.val
             
             # Create commit message
-            if final:
-                commit_message = f"""Final commit: {branch_name}
-
-Session completed at: {timestamp}
-
-Generated with ScopeFoundry Git Session Manager"""
-            else:
-                commit_message = f"""Progress: {branch_name}
-
-Updated at: {timestamp}
-
-Generated with ScopeFoundry Git Session Manager"""
+            commit_message = self._render_message("final" if final else "submodule_progress", branch_name)
             
-            # Add all changes in all submodules
-            self._run_git_command(['git', 'submodule', 'foreach', 'git add -A'])
-            
-            # Commit in all submodules
-            self._run_git_command(['git', 'submodule', 'foreach', 'git', 'commit', '-F', '-'], input_text=commit_message, check=False)
+            # Add and commit in each submodule in parallel, each commit gets its own copy of the message
+            self._map_submodules(self._commit_in_submodule, submodules, commit_message)
             
             self.log.info("Committed changes in submodules")
                     
         except Exception as e:
             self.log.error(f"Failed to commit submodule changes: {e}")
     
+    def _commit_in_submodule(self, submodule_path, commit_message):
+        """Stage and commit all changes in one submodule"""
+        try:
+            submodule_full_path = self._cwd / submodule_path
+            
+            subprocess.run(
+                ['git', 'add', '-A'],
+                cwd=submodule_full_path,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                text=True,
+                check=True
+            )
+            
+            result = subprocess.run(
+                ['git', 'commit', '-F', '-'],
+                cwd=submodule_full_path,
+                capture_output=True,
+                text=True,
+                check=False,
+                input=commit_message
+            )
+            
+            if result.returncode != 0 and "nothing to commit" not in result.stdout:
+                self.log.warning(f"Failed to commit in submodule {submodule_path}: {result.stderr.strip()}")
+            
+        except subprocess.CalledProcessError as e:
+            self.log.warning(f"Failed to stage changes in submodule {submodule_path}: {e.stderr}")
+        except Exception as e:
+            self.log.warning(f"Failed to process submodule {submodule_path}: {e}")
+    
     def return_to_parent_branch(self):
         """Return to the parent branch that the session was created from"""
         try:
@@ -506,7 +911,7 @@ Generated with ScopeFoundry Git Session Manager"""
                 self.return_submodules_to_parent_branch()
             
             # Switch to parent branch
-            self._run_git_command(['git', 'checkout', parent_branch])
+            self._run_git_command(['git', 'checkout', parent_branch], check=True, capture=False)
             
             # Update status
             self.refresh_git_status()
@@ -519,6 +924,8 @@ Generated with ScopeFoundry Git Session Manager"""
             
     def return_submodules_to_parent_branch(self):
         """Return all submodules to their parent branches using stored branch information"""
+        if not self.manage_submodules.val:
+            return
         try:
             submodules = self.get_submodules()
             
@@ -526,60 +933,70 @@ Generated with ScopeFoundry Git Session Manager"""
                 return
             
             # Read stored submodule parent branches
-            parent_branches_file = Path(self.repo_path.val) / '.git' / 'session_submodule_parents.txt'
+            parent_branches_file = self._gitdir / 'session_submodule_parents.json'
+            legacy_parent_branches_file = self._gitdir / 'session_submodule_parents.txt'
             submodule_parent_branches = {}
             
             if parent_branches_file.exists():
-                with open(parent_branches_file, 'r') as f:
+                submodule_parent_branches = json.loads(parent_branches_file.read_text())
+            elif legacy_parent_branches_file.exists():
+                # Sessions started by older versions stored path:branch lines
+                with open(legacy_parent_branches_file, 'r') as f:
                     for line in f:
                         line = line.strip()
                         if ':' in line:
                             path, branch = line.split(':', 1)
                             submodule_parent_branches[path] = branch
             
-            for submodule_path in submodules:
-                try:
-                    submodule_full_path = Path(self.repo_path.val) / submodule_path
-                    
-                    # Check for uncommitted changes in submodule
-                    result = subprocess.run(
-                        ['git', 'status', '--porcelain'],
-                        cwd=submodule_full_path,
-                        capture_output=True,
-                        text=True,
-                        check=True
-                    )
-                    
-                    if result.stdout.strip():
-                        self.log.warning(f"Submodule {submodule_path} has uncommitted changes. Skipping checkout.")
-                        continue
-                    
-                    # Get the stored parent branch for this submodule
-                    parent_branch = submodule_parent_branches.get(submodule_path)
-                    
-                    if not parent_branch:
-                        self.log.warning(f"No parent branch recorded for submodule {submodule_path}. Skipping checkout.")
-                        continue
-                    
-                    self.log.info(f"Returning submodule {submodule_path} to parent branch {parent_branch}")
-                    
-                    subprocess.run(
-                        ['git', 'checkout', parent_branch],
-                        cwd=submodule_full_path,
-                        capture_output=True,
-                        text=True,
-                        check=True
-                    )
-                    
-                    self.log.info(f"Returned submodule {submodule_path} to branch {parent_branch}")
-                    
-                except subprocess.CalledProcessError as e:
-                    self.log.warning(f"Failed to return submodule {submodule_path} to parent branch: {e.stderr}")
-                except Exception as e:
-                    self.log.warning(f"Failed to process submodule {submodule_path}: {e}")
+            # Submodules are independent working trees, check them out in parallel
+            self._map_submodules(
+                lambda submodule_path: self._return_submodule_to_branch(
+                    submodule_path, submodule_parent_branches.get(submodule_path)),
+                submodules
+            )
                     
         except Exception as e:
             self.log.error(f"Failed to return submodules to parent branch: {e}")
+    
+    def _return_submodule_to_branch(self, submodule_path, parent_branch):
+        """Check out the recorded parent branch in one submodule if it has no uncommitted changes"""
+        try:
+            submodule_full_path = self._cwd / submodule_path
+            
+            # Check for uncommitted changes in submodule
+            result = subprocess.run(
+                ['git', '--no-optional-locks', 'status', '--porcelain'],
+                cwd=submodule_full_path,
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            
+            if result.stdout.strip():
+                self.log.warning(f"Submodule {submodule_path} has uncommitted changes. Skipping checkout.")
+                return
+            
+            if not parent_branch:
+                self.log.warning(f"No parent branch recorded for submodule {submodule_path}. Skipping checkout.")
+                return
+            
+            self.log.info(f"Returning submodule {submodule_path} to parent branch {parent_branch}")
+            
+            subprocess.run(
+                ['git', 'checkout', parent_branch],
+                cwd=submodule_full_path,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                text=True,
+                check=True
+            )
+            
+            self.log.info(f"Returned submodule {submodule_path} to branch {parent_branch}")
+            
+        except subprocess.CalledProcessError as e:
+            self.log.warning(f"Failed to return submodule {submodule_path} to parent branch: {e.stderr}")
+        except Exception as e:
+            self.log.warning(f"Failed to process submodule {submodule_path}: {e}")
             
     def commit_session_changes(self, final=False):
         """Commit changes during the experimental session"""
@@ -596,38 +1013,29 @@ Generated with ScopeFoundry Git Session Manager"""
                 self.commit_submodule_changes(final)
                 
             # Add all changes
-            self._run_git_command(['git', 'add', '-A'])
+            self._run_git_command(['git', 'add', '-A'], check=True, capture=False)
             
             # Create commit message
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             branch_name = self.session_branch.val
-            
-            if final:
-                commit_message = f"""Final commit: {branch_name}
-
-Session completed at: {timestamp}
-
-Generated with ScopeFoundry Git Session Manager"""
-            else:
-                commit_message = f"""Progress commit: {branch_name}
-
-Updated at: {timestamp}
+            commit_message = self._render_message("final" if final else "progress", branch_name)
 
-Generated with ScopeFoundry Git Session Manager"""
-
-            self._run_git_command(['git', 'commit', '-F', '-'], input_text=commit_message)
+            cmd = ['git', 'commit', '-F', '-']
+            result = self._run_git_command(cmd, input_text=commit_message)
+            stdout, stderr, returncode = result
+            
+            if returncode != 0:
+                if "nothing to commit" in stdout or "nothing to commit" in stderr:
+                    self.log.info("No changes to commit")
+                    self.refresh_git_status()
+                    return
+                self._require_ok(result, cmd)
             
             # Update status
-            self.refresh_git_status()
+            self._status_after_commit(branch_name)
             
             commit_type = "Final" if final else "Progress"
             self.log.info(f"{commit_type} commit completed for session: {branch_name}")
             
-        except subprocess.CalledProcessError as e:
-            if "nothing to commit" in e.stderr:
-                self.log.info("No changes to commit")
-            else:
-                raise
         except Exception as e:
             self.log.error(f"Failed to commit session changes: {e}")
             raise
@@ -647,33 +1055,23 @@ Generated with ScopeFoundry Git Session Manager"""
             if self.manage_submodules.val:
                 self.commit_submodule_changes()
             
-            self._run_git_command(['git', 'add', '-A'])
+            self._run_git_command(['git', 'add', '-A'], check=True, capture=False)
             
-            _, _, returncode = self._run_git_command(
-                ['git', 'diff', '--cached', '--quiet'],
-                check=False
-            )
+            _, _, returncode = self._run_git_command(['git', 'diff', '--cached', '--quiet'])
             
             if returncode == 0:
                 self.log.info(f"No changes to commit for measurement: {measurement_name}")
                 self.refresh_git_status()
                 return self.current_commit_hash.val
             
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             session_info = self.session_branch.val if self.session_active.val else 'no active session'
             
-            commit_message = f"""Starting measurement: {measurement_name}
-
-Measurement Details:
-- Name: {measurement_name}
-- Started: {timestamp}
-- Session: {session_info}
-
-Generated with ScopeFoundry Git Session Manager"""
+            commit_message = self._render_message(
+                "measurement", measurement=measurement_name, session=session_info)
             
-            self._run_git_command(['git', 'commit', '-F', '-'], input_text=commit_message)
+            self._run_git_command(['git', 'commit', '-F', '-'], check=True, input_text=commit_message, capture=False)
             
-            self.refresh_git_status()
+            self._status_after_commit(self.current_branch.val)
             
             self.log.info(f"Created pre-measurement commit for: {measurement_name}")
             self.log.info(f"Git hash: {self.current_commit_hash.val}")
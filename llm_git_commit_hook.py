@@ -3,14 +3,56 @@ import json
 import sys
 import subprocess
 from pathlib import Path
-import hashlib
-from datetime import datetime
+import io
+import itertools
+import mmap
+from datetime import datetime, timezone
 import os
-import traceback
-import shutil
-import re
 from  . import convert_chat_logs
 
+try:
+    # Optional: much faster hash for fingerprinting skipped large files
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Fingerprint of skipped large files recorded in the commit message
+FILE_HASH_NAME = "XXH3" if xxhash is not None else "SHA256"
+
+# Decoder of just the message role of a transcript line, built on first use
+# by role_entry_decoder() (only get_last_interaction needs it), False
+# without msgspec
+_role_entry_decoder = None
+
+def role_entry_decoder():
+    """Get the msgspec decoder of a transcript line's message role, None without msgspec."""
+    global _role_entry_decoder
+    if _role_entry_decoder is None:
+        try:
+            # Optional: decode only the message role when sorting transcript lines
+            import msgspec
+        except ImportError:
+            _role_entry_decoder = False
+        else:
+            class _RoleMessage(msgspec.Struct):
+                role: str = ""
+
+            class _RoleEntry(msgspec.Struct):
+                message: _RoleMessage | None = None
+
+            _role_entry_decoder = msgspec.json.Decoder(_RoleEntry).decode
+    return _role_entry_decoder or None
+
+def transcript_line_role(line):
+    """Get the message role of a transcript JSONL line, None if it has no message."""
+    decode_role_entry = role_entry_decoder()
+    if decode_role_entry is not None:
+        # Skips over the message content without building any objects for it
+        message = decode_role_entry(line).message
+        return message.role if message is not None else None
+    message = convert_chat_logs.json_loads(line).get('message')
+    return message.get('role') if message is not None else None
+
 
 # Setup logging to file
 LOG_FILE = Path.home() / "claude_hook_debug.log"
@@ -19,25 +61,28 @@ def setup_logging():
     """Redirect all output to a log file."""
     global original_stderr
     original_stderr = sys.stderr
-    sys.stderr = open(LOG_FILE, 'a', encoding='utf-8')
+    # Line buffered, so the log is complete up to the last line even when
+    # the hook is killed (e.g. on timeout)
+    sys.stderr = open(LOG_FILE, 'a', encoding='utf-8', buffering=1)
     print(f"\n\n{'='*80}", file=sys.stderr)
     print(f"HOOK RUN AT {datetime.now()}", file=sys.stderr)
     print(f"{'='*80}\n", file=sys.stderr)
-    sys.stderr.flush()
 
 setup_logging()
 
 def debug_log(msg):
     """Log debug messages."""
+    # sys.stderr is the line buffered log file opened once by setup_logging
     print(f"[DEBUG] {msg}", file=sys.stderr)
-    with open(LOG_FILE, 'a') as f:
-        f.write("[DEBUG] {msg}\n")
-    sys.stderr.flush()
 
-def clean_ansi_codes(text):
-    """Remove ANSI escape codes from text."""
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    return ansi_escape.sub('', text)
+def print_traceback():
+    """Print the traceback of the exception being handled to the log."""
+    # imported here, only needed when something went wrong
+    import traceback
+    traceback.print_exc(file=sys.stderr)
+
+# Same ANSI escape cleanup (and compiled pattern) as the markdown conversion
+clean_ansi_codes = convert_chat_logs.clean_ansi_codes
 
 def extract_text_content(message):
     """Extract text content from message object (handles both string and list formats)."""
@@ -46,99 +91,90 @@ def extract_text_content(message):
         return ""
     
     content = message.get('content')
-    debug_log(f"extract_text_content: content type = {type(content)}")
     
     # Handle string content
     if isinstance(content, str):
-        debug_log(f"extract_text_content: string content, length = {len(content)}")
         return clean_ansi_codes(content)
     
     # Handle list of content blocks
     if isinstance(content, list):
-        debug_log(f"extract_text_content: list content, {len(content)} blocks")
-        texts = []
-        for i, block in enumerate(content):
-            block_type = block.get('type') if isinstance(block, dict) else 'not-dict'
-            debug_log(f"  Block {i}: type={block_type}")
-            if isinstance(block, dict) and block.get('type') == 'text':
-                text = block.get('text', '')
-                debug_log(f"  Block {i}: extracted {len(text)} chars")
-                texts.append(clean_ansi_codes(text))
-        result = '\n'.join(texts)
-        debug_log(f"extract_text_content: combined text length = {len(result)}")
-        return result
+        # clean the joined text once, no escape sequence can span the newline
+        return clean_ansi_codes('\n'.join(
+            block.get('text', '') for block in content
+            if isinstance(block, dict) and block.get('type') == 'text'))
     
     debug_log("extract_text_content: unknown content format")
     return ""
 
-def get_last_interaction(transcript_path):
-    """Extract the last user prompt and LLM's response from the transcript."""
-    debug_log(f"get_last_interaction: Reading transcript: {transcript_path}")
-    try:
-        with open(transcript_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        debug_log(f"get_last_interaction: Read {len(lines)} lines")
-        
-        # Parse JSONL (one JSON object per line)
-        events = []
-        for line_num, line in enumerate(lines, 1):
-            if not line.strip():
-                continue
-            try:
-                events.append(json.loads(line))
-            except json.JSONDecodeError as e:
-                debug_log(f"get_last_interaction: Could not parse line {line_num}: {e}")
-                continue
-        
-        debug_log(f"get_last_interaction: Parsed {len(events)} events")
-        
-        if not events:
-            debug_log("get_last_interaction: No events found")
-            return None, None
-        
-        # Find all user and assistant messages
-        user_messages = []
-        assistant_messages = []
-        
-        for i, entry in enumerate(events):
-            try:
-                # Skip if no message field
-                if 'message' not in entry:
-                    continue
-                
-                message = entry['message']
-                role = message.get('role')
-                
-                if role == 'user':
-                    user_messages.append(entry)
-                elif role == 'assistant':
-                    assistant_messages.append(entry)
-                    
-            except Exception as err:
-                debug_log(f"  Event {i}: error processing - {err}")
-                continue
-        
-        debug_log(f"get_last_interaction: Found {len(user_messages)} user, {len(assistant_messages)} assistant messages")
-        
-        if not user_messages:
-            debug_log("get_last_interaction: No user messages found")
+def open_transcript(transcript):
+    """Open a transcript for reading binary lines, either a path or its contents already read as bytes."""
+    if isinstance(transcript, bytes):
+        return io.BytesIO(transcript)
+    return open(transcript, 'rb')
+
+def iter_lines_reversed(data):
+    """Yield the lines of a bytes-like transcript buffer from last to first, without line endings."""
+    end = len(data)
+    while end > 0:
+        start = data.rfind(b'\n', 0, end) + 1
+        yield data[start:end]
+        end = start - 1
+
+def iter_line_roles(lines):
+    """Yield (role, line) for the non-empty transcript lines, skipping lines that can not be parsed."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            role = transcript_line_role(line)
+        except Exception as e:
+            debug_log(f"iter_line_roles: Could not parse line: {e}")
+            continue
+        yield role, line
+
+def get_last_interaction(transcript):
+    """Extract the last user prompt and LLM's response from the transcript (path or bytes)."""
+    if isinstance(transcript, bytes):
+        debug_log(f"get_last_interaction: Reading transcript from memory ({len(transcript)} bytes)")
+        data = transcript
+    else:
+        debug_log(f"get_last_interaction: Reading transcript: {transcript}")
+        try:
+            with open(transcript, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file can not be mapped
+            data = b""
+        except Exception as e:
+            debug_log(f"get_last_interaction: Exception - {e}")
+            print_traceback()
             return None, None
-        
-        # Find the last user message with actual text content (not just tool results)
+    try:
+        # Walk the JSONL lines (one JSON object per line) from the end, only
+        # the message role is decoded until the last user message with text
+        # content (not just tool results) is found. The assistant messages
+        # passed on the way are the ones that can hold the response.
+        json_loads = convert_chat_logs.json_loads
+        line_roles = iter_line_roles(iter_lines_reversed(data))
+        tail_assistant_messages = []  # last first
         last_user = None
-        for user_msg in reversed(user_messages):
-            prompt = extract_text_content(user_msg['message'])
-            if prompt and prompt.strip():
-                last_user = user_msg
-                debug_log(f"get_last_interaction: Found user message with text content")
-                break
+        for role, line in line_roles:
+            if role == 'assistant':
+                tail_assistant_messages.append(line)
+            elif role == 'user':
+                user_msg = json_loads(line)
+                prompt = extract_text_content(user_msg['message'])
+                if prompt and prompt.strip():
+                    last_user = user_msg
+                    debug_log(f"get_last_interaction: Found user message with text content")
+                    break
+        
+        debug_log(f"get_last_interaction: Found {len(tail_assistant_messages)} assistant messages after it")
         
         if not last_user:
             debug_log("get_last_interaction: No user messages with text content found")
             return None, None
         
-        prompt = extract_text_content(last_user['message'])
         debug_log(f"get_last_interaction: Prompt length = {len(prompt)}")
         
         # Find assistant responses after the last user message with text
@@ -150,34 +186,37 @@ def get_last_interaction(transcript_path):
         except Exception as e:
             debug_log(f"get_last_interaction: Could not parse user timestamp: {e}")
         
-        # Get responses after the last user message
-        relevant_assistant = []
-        for entry in assistant_messages:
-            if last_user_ts:
-                try:
-                    entry_ts = datetime.fromisoformat(entry.get('timestamp', ''))
-                    if entry_ts > last_user_ts:
-                        relevant_assistant.append(entry)
-                except:
-                    relevant_assistant.append(entry)
-            else:
-                relevant_assistant.append(entry)
-        
-        debug_log(f"get_last_interaction: Found {len(relevant_assistant)} relevant assistant messages")
-        
-        # Extract response - look for the first assistant message with text content
+        # Extract response - the first assistant message after the last user
+        # message with text content, timestamps are only parsed until it is found.
+        # Only the lines after the prompt are candidates: unlike a forward scan
+        # over the whole file, an earlier assistant message without a (parseable)
+        # timestamp is never taken here, only by the fallback below.
+        fromisoformat = datetime.fromisoformat
         response = ""
-        for asst_msg in relevant_assistant:
+        for asst_line in reversed(tail_assistant_messages):
+            asst_msg = json_loads(asst_line)
+            if last_user_ts:
+                # missing, unparseable or incomparable timestamps count as after
+                ts_raw = asst_msg.get('timestamp')
+                if ts_raw:
+                    try:
+                        if fromisoformat(ts_raw) <= last_user_ts:
+                            continue
+                    except (TypeError, ValueError):
+                        pass
             response = extract_text_content(asst_msg['message'])
             if response and response.strip():
                 debug_log(f"get_last_interaction: Found assistant response with text")
                 break
         
-        if not response and assistant_messages:
-            # Fallback: try to find any assistant message with text
+        if not response:
+            # Fallback: try to find any assistant message with text, going on
+            # with the lines before the last user message once the ones after
+            # it are exhausted
             debug_log("get_last_interaction: Fallback - searching all assistant messages")
-            for asst_msg in reversed(assistant_messages):
-                response = extract_text_content(asst_msg['message'])
+            earlier_assistant_messages = (line for role, line in line_roles if role == 'assistant')
+            for asst_line in itertools.chain(tail_assistant_messages, earlier_assistant_messages):
+                response = extract_text_content(json_loads(asst_line)['message'])
                 if response and response.strip():
                     debug_log(f"get_last_interaction: Found assistant response in fallback")
                     break
@@ -193,49 +232,56 @@ def get_last_interaction(transcript_path):
     
     except Exception as e:
         debug_log(f"get_last_interaction: Exception - {e}")
-        traceback.print_exc(file=sys.stderr)
+        print_traceback()
         return None, None
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
     
-def get_new_prompt_and_response(transcript_path, t_start):
+def iter_transcript_entries(transcript):
+    """Yield the parsed entries of a transcript (path or bytes), skipping lines that can not be parsed."""
+    json_loads = convert_chat_logs.json_loads
+    with open_transcript(transcript) as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json_loads(line)
+            except ValueError as e:
+                debug_log(f"iter_transcript_entries: Could not parse line {line_num}: {e}")
+
+def get_new_prompt_and_response(transcript, t_start):
     """get the first user prompt and assistant final response
         for new conversation since last git commit on datetime timestamp t_start
+        transcript is the transcript path, its contents as bytes or its parsed entries
+        returns None, None when there is no new conversation
         """
-    entries = []
-    with open(transcript_path, 'rb') as f:
-        for line in f:
-            j = json.loads(line)
-            timestamp_str = j.get('timestamp')
-            if timestamp_str:
-                t= datetime.fromisoformat(timestamp_str.replace("Z", "+00:00"))
-            else:
-                t = None
-
-            if t and t > t_start:
-                entries.append(j)
-
-    for entry in entries:
-        if convert_chat_logs.is_noise_message(entry):
+    if isinstance(transcript, (bytes, str, os.PathLike)):
+        transcript = iter_transcript_entries(transcript)
+    # Transcript timestamps are UTC with milliseconds, e.g.
+    # 2025-01-31T12:34:56.789Z, which order the same as strings: compare
+    # them to t_start written the same way (milliseconds truncated, which
+    # keeps > exact) and only parse other formats.
+    t_start_utc = t_start.astimezone(timezone.utc)
+    t_start_iso = t_start_utc.strftime("%Y-%m-%dT%H:%M:%S.") + f"{t_start_utc.microsecond // 1000:03d}Z"
+    iso_len = len(t_start_iso)
+    prompt = response = None
+    # single pass: the first message with content is the "prompt",
+    # the last one the "response"
+    for j in transcript:
+        timestamp_str = j.get('timestamp')
+        if not timestamp_str:
             continue
-
-        # first one we find is the "prompt"
-        message = entry.get('message', {})
-        # Extract content
-        content = convert_chat_logs.extract_message_content(message)
-        content = convert_chat_logs.clean_ansi_codes(content)
-
-        # Skip empty messages
-        if not content or content.strip() == '':
+        if len(timestamp_str) == iso_len and timestamp_str[-1] == 'Z' and timestamp_str[10] == 'T':
+            if timestamp_str <= t_start_iso:
+                continue
+        elif datetime.fromisoformat(timestamp_str.replace("Z", "+00:00")) <= t_start:
             continue
 
-        prompt = content
-        break
-
-    for entry in entries[::-1]:
-        if convert_chat_logs.is_noise_message(entry):
+        if convert_chat_logs.is_noise_message(j):
             continue
 
-        # last one we find is the "response" (note the [::-1] above)
-        message = entry.get('message', {})
+        message = j.get('message', {})
         # Extract content
         content = convert_chat_logs.extract_message_content(message)
         content = convert_chat_logs.clean_ansi_codes(content)
@@ -244,22 +290,47 @@ def get_new_prompt_and_response(transcript_path, t_start):
         if not content or content.strip() == '':
             continue
 
+        if prompt is None:
+            prompt = content
         response = content
-        break
+
+    if prompt is None:
+        debug_log("get_new_prompt_and_response: No new messages with content")
+        return None, None
 
     debug_log(f"get_new_prompt_and_response: SUCCESS - prompt={len(prompt)} chars, response={len(response)} chars")
     return prompt, response
 
 
-def calculate_sha256(filepath):
-    """Calculate SHA-256 hash of a file."""
-    sha256_hash = hashlib.sha256()
+def calculate_file_hash(filepath):
+    """Calculate the FILE_HASH_NAME hash of a file."""
+    # imported here, the hook runs on every interaction but rarely hashes
+    import hashlib
+    new_file_hash = xxhash.xxh3_128 if xxhash is not None else hashlib.sha256
+    file_hash = new_file_hash()
     BUF_SIZE = 65536
     try:
         with open(filepath, "rb") as f:
+            # Only called for large files: hash the memory-mapped file in one
+            # update instead of looping over chunks in Python
+            if os.fstat(f.fileno()).st_size == 0:
+                # mmap cannot map an empty file
+                return file_hash.hexdigest()
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    file_hash.update(mm)
+                return file_hash.hexdigest()
+            except (OSError, ValueError) as e:
+                # some filesystems cannot be mapped, read in chunks instead
+                debug_log(f"calculate_file_hash: mmap failed for {filepath}, reading in chunks: {e}")
+                f.seek(0)
+            if hasattr(hashlib, 'file_digest'):
+                # Python 3.11+ runs the read loop in C
+                return hashlib.file_digest(f, new_file_hash).hexdigest()
+            file_hash = new_file_hash()
             for byte_block in iter(lambda: f.read(BUF_SIZE), b""):
-                sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
+                file_hash.update(byte_block)
+        return file_hash.hexdigest()
     except Exception as e:
         return f"Error: {str(e)}"
 
@@ -268,11 +339,11 @@ def push_to_remote(branch_name):
     try:
         debug_log(f"push_to_remote: Checking upstream for branch {branch_name}")
         
-        # Check if branch has an upstream
+        # Check if branch has an upstream, only the exit code is used
         result = subprocess.run(
             ['git', 'rev-parse', '--abbrev-ref', f'{branch_name}@{{upstream}}'],
-            capture_output=True,
-            text=True
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
         )
         
         if result.returncode == 0:
@@ -303,36 +374,72 @@ def push_to_remote(branch_name):
         print("Commit was created locally but not pushed", file=sys.stderr)
     except Exception as e:
         debug_log(f"push_to_remote: Exception - {e}")
-        traceback.print_exc(file=sys.stderr)
+        print_traceback()
         print(f"Warning: Failed to push to remote: {e}", file=sys.stderr)
 
-def create_commit(prompt, response, branch_name):
+def read_repo_state():
+    """Get the current branch, the repository top level and the datetime of the last commit.
+
+    The branch is "HEAD" when detached (as `git rev-parse --abbrev-ref HEAD`)
+    and the last commit datetime is None if it can not be read.
+    """
+    # Two git processes rather than pygit2: importing pygit2 alone costs
+    # more than both commands together, and the hook pays it on every run
+    result = subprocess.run(
+        ['git', 'rev-parse', '--abbrev-ref', 'HEAD', '--show-toplevel'],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    branch, repo_path = result.stdout.splitlines()[:2]
+
+    # Git timestamp of previous commit, strict ISO 8601 (%cI) parses with
+    # fromisoformat on every Python 3 version, unlike %ci
+    try:
+        result = subprocess.run(
+            ['git', 'log', '-1', '--format=%cI'],
+            capture_output=True,
+            text=True
+        )
+        t_last_commit = datetime.fromisoformat(result.stdout.strip())
+    except Exception as err:
+        debug_log(f"read_repo_state: failed to get git timestamp {err}")
+        t_last_commit = None
+    return branch, Path(repo_path), t_last_commit
+
+def create_commit(prompt, response, branch_name, repo_path=None):
     """Create a git commit with the prompt and response, then push."""
     try:
         debug_log("create_commit: Starting commit process")
         
         # Get Git Repo Path
-        result = subprocess.run(
-            ['git', 'rev-parse', '--show-toplevel'],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        repo_path = Path(result.stdout.strip())
+        if repo_path is None:
+            result = subprocess.run(
+                ['git', 'rev-parse', '--show-toplevel'],
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            repo_path = Path(result.stdout.strip())
         debug_log(f"create_commit: Repo path = {repo_path}")
 
         # Stage all changes
         debug_log("create_commit: Staging all changes (git add -A)")
         subprocess.run(['git', 'add', '-A'], check=True)
         
-        # Check if there are changes to commit
+        # Check if there are changes to commit, the staged file list is
+        # also used below to look for large files (NUL separated so that
+        # unusual file names are not quoted). The names are kept as bytes,
+        # only the few large ones are decoded for the commit message.
         debug_log("create_commit: Checking for staged changes")
         result = subprocess.run(
-            ['git', 'diff', '--cached', '--quiet'],
-            capture_output=True
+            ["git", "diff", "--staged", "--name-only", "-z"],
+            capture_output=True,
+            check=True
         )
+        staged_files = [filepath for filepath in result.stdout.split(b'\0') if filepath]
         
-        if result.returncode == 0:
+        if not staged_files:
             debug_log("create_commit: No changes to commit")
             print("No changes to commit", file=sys.stderr)
             return
@@ -352,38 +459,39 @@ Response: {response_preview}"""
         # Skip large files, but record the skips
         MAX_FILE_SIZE = 10 * 1024 * 1024
         debug_log("create_commit: Checking for large files")
-        result = subprocess.run(
-            ["git", "diff", "--staged", "--name-only"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        staged_files = result.stdout.strip().split('\n')
         debug_log(f"create_commit: {len(staged_files)} staged files")
 
         large_files = []
+        repo_path_bytes = os.fsencode(repo_path)
         for filepath in staged_files:
-            if not filepath:
-                continue
-            
-            full_path = repo_path / filepath
-            if not full_path.exists():
+            # one stat per file, deleted files are skipped
+            full_path = os.path.join(repo_path_bytes, filepath)
+            try:
+                file_size = os.stat(full_path).st_size
+            except (FileNotFoundError, NotADirectoryError):
                 continue
             
-            file_size = full_path.stat().st_size
             if file_size > MAX_FILE_SIZE:
-                sha_hash = calculate_sha256(full_path)
-                large_files.append((filepath, file_size, sha_hash))
+                large_files.append((filepath, file_size, full_path))
         
         if large_files:
             debug_log(f"create_commit: Found {len(large_files)} large files, unstaging")
-            for filepath, size, sha_hash in large_files:
-                subprocess.run(["git", "reset", "HEAD", filepath], cwd=repo_path)
-            
-            commit_msg += f"""\n\nPrevented commit of {len(large_files)} large file(s) (>{MAX_FILE_SIZE/(1024*1024):.0f}MB):\n"""            
-            for filepath, size, sha_hash in large_files:
-                size_mb = size / (1024 * 1024)
-                commit_msg += f"  - {filepath} ({size_mb:.2f} MB) SHA256: {sha_hash}\n"
+            # imported here, only needed when there are large files
+            from concurrent.futures import ThreadPoolExecutor
+            # The hashes only go into the commit message: compute them in
+            # worker threads (hashing releases the GIL) while git unstages
+            with ThreadPoolExecutor() as executor:
+                hash_futures = [executor.submit(calculate_file_hash, full_path)
+                                for _, _, full_path in large_files]
+                subprocess.run(
+                    ["git", "reset", "-q", "HEAD", "--", *[filepath for filepath, _, _ in large_files]],
+                    cwd=repo_path
+                )
+                
+                commit_msg += f"""\n\nPrevented commit of {len(large_files)} large file(s) (>{MAX_FILE_SIZE/(1024*1024):.0f}MB):\n"""            
+                for (filepath, size, _), hash_future in zip(large_files, hash_futures):
+                    size_mb = size / (1024 * 1024)
+                    commit_msg += f"  - {os.fsdecode(filepath)} ({size_mb:.2f} MB) {FILE_HASH_NAME}: {hash_future.result()}\n"
 
         # Create the commit
         debug_log("create_commit: Creating commit")
@@ -402,19 +510,21 @@ Response: {response_preview}"""
         debug_log(f"create_commit: CalledProcessError - returncode={e.returncode}")
         debug_log(f"create_commit: stdout={e.stdout}")
         debug_log(f"create_commit: stderr={e.stderr}")
+        # the git command, exit code and output above say what went wrong
         print(f"Git error: {e}", file=sys.stderr)
-        traceback.print_exc(file=sys.stderr)
     except Exception as e:
         debug_log(f"create_commit: Exception - {e}")
-        traceback.print_exc(file=sys.stderr)
+        print_traceback()
         print(f"Error creating commit: {e}", file=sys.stderr)
 
-def write_to_conversation_file(prompt, response, filename):
-    """Append interaction to conversation markdown file."""
+def write_to_conversation_file(prompt, response, filename, now=None):
+    """Append interaction to conversation markdown file, stamped with now (default datetime.now())."""
     debug_log(f"write_to_conversation_file: Writing to {filename}")
     conversation_file = Path(filename)
 
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if now is None:
+        now = datetime.now()
+    timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
     entry = f"""---
 
 ## {timestamp}
@@ -425,19 +535,22 @@ def write_to_conversation_file(prompt, response, filename):
 **LLM:**
 {response}
 
-"""
+""".encode('utf-8')
 
     try:
-        with open(conversation_file, 'a', encoding='utf-8') as f:
-            if conversation_file.exists() and conversation_file.stat().st_size == 0:
-                f.write("# LLM Conversations\n\n")
+        # binary mode: the entry is encoded once above, no text layer
+        with open(conversation_file, 'ab') as f:
+            # append mode opens at the end of the file, so a new (or empty)
+            # file is at position 0
+            if f.tell() == 0:
+                entry = b"# LLM Conversations\n\n" + entry
             f.write(entry)
         
         debug_log(f"write_to_conversation_file: Saved {len(entry)} bytes")
         print(f"Saved conversation to {conversation_file}", file=sys.stderr)
     except Exception as e:
         debug_log(f"write_to_conversation_file: Exception - {e}")
-        traceback.print_exc(file=sys.stderr)
+        print_traceback()
         print(f"Error writing conversation file: {e}", file=sys.stderr)
 
 def main():
@@ -458,16 +571,9 @@ def main():
             print("Error: No transcript path provided", file=sys.stderr)
             sys.exit(1)
 
-        # Get current branch
+        # Get current branch, repo path and git timestamp of previous commit
         debug_log("main: Getting current branch")
-        result = subprocess.run(
-            ['git', 'rev-parse', '--abbrev-ref', 'HEAD'],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-
-        branch = result.stdout.strip()
+        branch, repo_path, t_git = read_repo_state()
         debug_log(f"main: Current branch = {branch}")
 
         if not branch:
@@ -477,36 +583,48 @@ def main():
 
         session_dir = Path(f"llm-sessions/{branch_clean}/")
         debug_log(f"main: Session dir = {session_dir}")
-        session_dir.mkdir(parents=True, exist_ok=True)
 
-        # Git timestamp of previous commit
-        try:
-            result = subprocess.run(
-                ['git', 'log', '-1', '--format=%ci'],
-                capture_output=True,
-                text=True
-            )
-            t_git = datetime.fromisoformat(result.stdout.strip())
-        except Exception as err:
-            debug_log(f"main: failed to get git timestamp {err}")
-            t_git = None
 
 
+        # A transcript last written before the previous commit holds nothing
+        # newer than it, so there is nothing to copy, convert or commit
+        transcript_path = Path(transcript_path)
+        transcript_stat = os.stat(transcript_path)
+        if t_git and transcript_stat.st_mtime <= t_git.timestamp():
+            debug_log("main: Transcript unchanged since the last commit, exiting")
+            print("No new LLM interaction since the last commit. Skipping LLM commit.", file=sys.stderr)
+            sys.exit(0)
 
-        # Copy transcript
+        # Copy transcript, keeping the contents to parse them without reading the file again
         debug_log("main: Copying transcript")
-        transcript_path = Path(transcript_path)
         destination = session_dir / "claude_transcript" / transcript_path.name
+        # also creates session_dir
         destination.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy2(transcript_path, destination)
-        debug_log(f"main: Transcript copied to {destination}")
+        transcript_data = transcript_path.read_bytes()
+        try:
+            destination_stat = os.stat(destination)
+        except FileNotFoundError:
+            destination_stat = None
+        # the copy gets the transcript's mtime (copystat), so the same size
+        # and mtime mean it is still up to date
+        if (destination_stat is not None
+                and destination_stat.st_size == transcript_stat.st_size
+                and destination_stat.st_mtime_ns == transcript_stat.st_mtime_ns):
+            debug_log(f"main: Transcript copy {destination} is up to date")
+        else:
+            destination.write_bytes(transcript_data)
+            import shutil
+            shutil.copystat(transcript_path, destination)
+            debug_log(f"main: Transcript copied to {destination}")
 
         # Get the last interaction
         debug_log("main: Calling get_last_interaction")
         #prompt, response = get_last_interaction(transcript_path)
         if not t_git:
-            t_git = datetime.fromtimestamp(0)
-        prompt, response = get_new_prompt_and_response(transcript_path, t_git)
+            t_git = datetime.fromtimestamp(0, timezone.utc)
+        # parsed once, for the prompt and response and for the markdown
+        transcript_entries = list(iter_transcript_entries(transcript_data))
+        prompt, response = get_new_prompt_and_response(transcript_entries, t_git)
 
         debug_log(f"main: get_last_interaction returned prompt={prompt is not None}, response={response is not None}")
         
@@ -518,21 +636,27 @@ def main():
 
 
         # Write to conversation file (new version)
-        from convert_chat_logs import convert_jsonl_to_markdown
-        convert_jsonl_to_markdown(transcript_path,session_dir / f"conversation-{branch_clean}-{claude_session_id}.md" )
+        # one timestamp for everything this hook run writes
+        now = datetime.now()
+        convert_chat_logs.convert_entries_to_markdown(
+            transcript_entries,
+            session_dir / f"conversation-{branch_clean}-{claude_session_id}.md",
+            transcript_path.stem,
+            now=now)
 
         # # Write to conversation file
         # debug_log("main: Writing to conversation file")
         # write_to_conversation_file(
         #     prompt, 
         #     response, 
-        #     filename=session_dir / f"conversation-{branch_clean}.md"
+        #     filename=session_dir / f"conversation-{branch_clean}.md",
+        #     now=now
         # )
         
         # Create commit and push
         if branch.startswith("session-"):
             debug_log(f"main: On session branch, creating commit")
-            create_commit(prompt, response, branch)
+            create_commit(prompt, response, branch, repo_path)
         else:
             debug_log(f"main: Not on session branch ({branch}), skipping commit")
             print(f"Not on a session branch ({branch}), skipping commit", file=sys.stderr)
@@ -542,12 +666,12 @@ def main():
     except json.JSONDecodeError as e:
         debug_log(f"main: JSONDecodeError - {e}")
         print(f"Error: Invalid JSON input: {e}", file=sys.stderr)
-        traceback.print_exc(file=sys.stderr)
+        print_traceback()
         sys.exit(1)
     except Exception as e:
         debug_log(f"main: Unexpected exception - {e}")
         print(f"Unexpected error: {e}", file=sys.stderr)
-        traceback.print_exc(file=sys.stderr)
+        print_traceback()
         sys.exit(1)
     finally:
         sys.stderr.flush()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from convert_chat_logs import extract_message_content, tool_result_text
+
+
+class ToolResultTextTest(unittest.TestCase):
+    """tool_result content is a string, a list of blocks or null"""
+    
+    def test_string_is_unchanged(self):
+        self.assertEqual(tool_result_text("output"), "output")
+    
+    def test_list_of_blocks(self):
+        content = [{'type': 'text', 'text': 'a'}, 'b', {'type': 'image'}]
+        self.assertEqual(tool_result_text(content), "a\nb")
+    
+    def test_null_content(self):
+        self.assertEqual(tool_result_text(None), '')
+    
+    def test_other_content(self):
+        self.assertEqual(tool_result_text(42), '')
+        self.assertEqual(tool_result_text({'type': 'text', 'text': 'a'}), '')
+    
+    def test_message_with_null_tool_result(self):
+        message = {'content': [{'type': 'tool_result', 'content': None}]}
+        self.assertEqual(extract_message_content(message), "```\n\n```")
+
+
+if __name__ == "__main__":
+    unittest.main()